@@ -52,7 +52,7 @@ if __name__ == "__main__":
     p2 = P2Step(str(config_path))
     p2.run()
 
-    print("After initial run, p2.needs_run():", p2.needs_run())  # Should be False
+    print("After initial run, p2.needs_run():", bool(p2.needs_run()))  # Should be False
 
     # Demonstrate that nested dict order doesn't affect change detection
     print("Modifying config with same nested dict but different key order...")
@@ -61,21 +61,22 @@ if __name__ == "__main__":
     )
     p2.config = p2.load_config()  # Reload config
     print(
-        "After reloading config with reordered keys, p2.needs_run():", p2.needs_run()
+        "After reloading config with reordered keys, p2.needs_run():",
+        bool(p2.needs_run()),
     )  # Should still be False
 
     # Demonstrate input file management: if input is newer than output, needs rerun
-    print("Before modification, needs_run:", p2.needs_run())  # Should be False
+    print("Before modification, needs_run:", bool(p2.needs_run()))  # Should be False
     time.sleep(1)  # Ensure timestamp difference
     input_path = p2.workdir / "output.json"
     with open(input_path, "w") as f:
         json.dump({"geometry": "modified"}, f)
     print("Modified input file to make it newer.")
-    print("After modification, needs_run:", p2.needs_run())  # Should be True
+    print("After modification, needs_run:", bool(p2.needs_run()))  # Should be True
     p2.run()  # Should re-execute
 
     # Demonstrate force run
-    print("After re-run, needs_run:", p2.needs_run())  # Should be False
+    print("After re-run, needs_run:", bool(p2.needs_run()))  # Should be False
     print("Running with force=True to demonstrate forced execution.")
     p2.run(force=True)  # Should execute even though needs_run is False
     print("Force run completed.")
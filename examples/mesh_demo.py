@@ -5,15 +5,8 @@ import logging
 import time
 from pathlib import Path
 
-from rich.logging import RichHandler
 from statesman.core.base import Statesman
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    handlers=[RichHandler()],
-)
-
 
 class MeshStep(Statesman):
     """Step that depends on mesh section."""
@@ -30,6 +23,14 @@ class MeshStep(Statesman):
 
 
 if __name__ == "__main__":
+    from rich.logging import RichHandler
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[RichHandler()],
+    )
+
     config_path = Path(__file__).parent / "sample_config.yaml"
     mesh_step = MeshStep(str(config_path))
 
@@ -44,9 +45,9 @@ if __name__ == "__main__":
         mesh_step.logger.info(f"Removed existing state file: {state_file}")
 
     mesh_step.logger.info("Initial check")
-    print("Initial needs_run:", mesh_step.needs_run())
+    print("Initial needs_run:", bool(mesh_step.needs_run()))
     mesh_step.run()
-    print("After run, needs_run:", mesh_step.needs_run())
+    print("After run, needs_run:", bool(mesh_step.needs_run()))
 
     # Modify the mesh section
     mesh_step.logger.info("Modifying mesh section...")
@@ -56,9 +57,9 @@ if __name__ == "__main__":
     config_path.write_text(modified_content)
     mesh_step.config = mesh_step.load_config()  # Reload config
     mesh_step.logger.info("After modifying mesh, checking needs_run")
-    print("After modifying mesh, needs_run:", mesh_step.needs_run())
+    print("After modifying mesh, needs_run:", bool(mesh_step.needs_run()))
     mesh_step.run()
-    print("After re-run, needs_run:", mesh_step.needs_run())
+    print("After re-run, needs_run:", bool(mesh_step.needs_run()))
 
     # Test with float change
     mesh_step.logger.info("Modifying float in mesh...")
@@ -66,4 +67,4 @@ if __name__ == "__main__":
     config_path.write_text(modified_content)
     mesh_step.config = mesh_step.load_config()
     mesh_step.logger.info("After modifying float, checking needs_run")
-    print("After modifying float, needs_run:", mesh_step.needs_run())
+    print("After modifying float, needs_run:", bool(mesh_step.needs_run()))
@@ -1,22 +1,86 @@
 """CLI entry point for statesman."""
 
 import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Type
 
-from rich.logging import RichHandler
 from treeparse import cli, command, option
 from statesman.core.base import Statesman
+from statesman.utils.config_utils import hash_bytes
+from statesman.utils.file_utils import absolute_path
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    handlers=[RichHandler()],
-)
+
+def _configure_logging():
+    """Set up rich logging; deferred so importing the CLI stays cheap."""
+    from rich.logging import RichHandler
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[RichHandler()],
+    )
+
+
+def _file_digest(path: Path) -> Optional[str]:
+    """Hash a file's contents, or None if it does not exist."""
+    try:
+        return hash_bytes(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+class StatesmanSession:
+    """Keeps one Statesman per config path alive across commands.
+
+    Meant for long-lived callers such as REPLs. An instance is rebuilt when its
+    config file or state log no longer matches what it was built from, so edits
+    and states written by other processes are picked up. Contents are compared
+    rather than stat keys, which coarse timestamps can leave unchanged.
+    """
+
+    def __init__(self, step_cls: Type[Statesman] = Statesman):
+        self.step_cls = step_cls
+        self._steps: Dict[Path, Tuple[Statesman, Tuple[Optional[str], ...]]] = {}
+
+    @staticmethod
+    def _fingerprint(statesman: Statesman) -> Tuple[Optional[str], ...]:
+        return (
+            _file_digest(statesman.config_path),
+            _file_digest(statesman.state_file),
+        )
+
+    def get(self, config: str) -> Statesman:
+        """Get the Statesman for a config, rebuilding it if its files changed."""
+        path = absolute_path(config)
+        entry = self._steps.get(path)
+        if entry is not None and entry[1] == self._fingerprint(entry[0]):
+            return entry[0]
+        statesman = self.step_cls(config)
+        self._steps[path] = (statesman, self._fingerprint(statesman))
+        return statesman
+
+    def run(self, config: str, force: bool = False):
+        """Run the step for a config, keeping it reusable afterwards."""
+        statesman = self.get(config)
+        statesman.run(force=force)
+        # The step's own state writes should not force a rebuild
+        self._steps[absolute_path(config)] = (statesman, self._fingerprint(statesman))
+
+
+_session: Optional[StatesmanSession] = None
+
+
+def get_session() -> StatesmanSession:
+    """Get the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        _session = StatesmanSession()
+    return _session
 
 
 def run(config: str, force: bool = False):
     """Run the workflow step, optionally forcing execution."""
-    statesman = Statesman(config)
-    statesman.run(force=force)
+    get_session().run(config, force=force)
     logging.info("Run completed.")
 
 
@@ -55,6 +119,7 @@ app.commands.append(run_cmd)
 
 
 def main():
+    _configure_logging()
     app.run()
 
 
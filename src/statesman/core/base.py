@@ -1,19 +1,54 @@
 """Base class for state management."""
 
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple, Union
 
 import logging
-import ruamel.yaml as yaml
-from pydantic import BaseModel, ValidationError
+import marshal
+import os
+import sys
+import tempfile
+import time
+from ruamel.yaml import YAML
 
-from statesman.utils.config_utils import hash_config_section
-from statesman.utils.file_utils import get_file_mtime
+from statesman.utils.config_utils import (
+    hash_bytes,
+    hash_config_section,
+    read_parse_cache,
+    write_parse_cache,
+)
+from statesman.utils.file_utils import absolute_path, is_file_non_empty, stat_many
 
 from statesman.models.state import FileState
 
+# Shared YAML 1.2 safe parser (libyaml-backed when ruamel.yaml.clib is present);
+# building a YAML() instance per call dominates small loads.
+_YAML = YAML(typ="safe")
 
-class ManagedFile(BaseModel):
+# Parsed configs (marshalled, with their root hash) reused while the file's stat
+# key holds; each load unmarshals a private copy the instance may edit freely.
+_config_cache: Dict[Path, Tuple[Tuple[int, int, int], bytes, str]] = {}
+
+# Files modified this recently may be rewritten without changing their stat key
+# (coarse filesystem timestamps), so they are not cached in memory or on disk.
+_RACY_WINDOW_NS = 2_000_000_000
+
+# Bump whenever hashes or the state file layout change; older states are discarded.
+_STATE_VERSION = 5
+
+# First line of the state log; each further line is "section\thash\troot".
+_STATE_HEADER = f"@version\t{_STATE_VERSION}"
+
+# Rewrite the state log once it holds this many lines per section.
+_STATE_COMPACT_RATIO = 4
+
+
+@dataclass(slots=True, frozen=True)
+class ManagedFile:
     """Configuration for a managed file."""
 
     name: str
@@ -21,6 +56,34 @@ class ManagedFile(BaseModel):
     newer_than: Union[str, Path, None] = None  # Can be 'config' or a Path
 
 
+class RunTrigger(Enum):
+    """Check in `needs_run` that required the step to run."""
+
+    INVALID_INPUT = "invalid_input"
+    MISSING_OUTPUT = "missing_output"
+    INPUT_NEWER = "input_newer"
+    SECTION_CHANGED = "section_changed"
+
+
+@dataclass(frozen=True)
+class RunReason:
+    """Outcome of `needs_run`; truthy when the step needs to run."""
+
+    trigger: Optional[RunTrigger] = None
+    changed_sections: FrozenSet[str] = frozenset()
+    # Sections verified unchanged, whose saved hash is still current
+    unchanged_sections: FrozenSet[str] = frozenset()
+
+    def __bool__(self) -> bool:
+        return self.trigger is not None
+
+
+@lru_cache(maxsize=None)
+def _key_parts(key: str) -> Tuple[str, ...]:
+    """Split a dotted config key path, once per distinct key."""
+    return tuple(key.split("."))
+
+
 class Statesman:
     """Base class for managing workflow states."""
 
@@ -28,142 +91,390 @@ class Statesman:
     output_files: List[str] = []
     dependent_sections: List[str] = []
     workdir_key: str = "workdir"
+    # Directory for the on-disk cache of parsed configs; disabled when None
+    config_cache_dir: Optional[Union[str, Path]] = None
 
     def __init__(self, config_path: str):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.config_path = Path(config_path).resolve()
-        self.logger.info(f"Initializing Statesman with config: {self.config_path}")
-        self.config = self.load_config()
+        self.config_path = absolute_path(config_path)
+        self.logger.info("Initializing Statesman with config: %s", self.config_path)
+        self._last_read: Tuple[Any, Optional[str]] = (None, None)
+        self._config = self.load_config()
+        # The root only vouches for a config exactly as the default loader read it
+        read_config, root = self._last_read
+        default_loader = type(self).load_config is Statesman.load_config
+        if default_loader and self._config is read_config:
+            self._trusted_root = root
+        else:
+            self._trusted_root = None
+        # Interned section names compare by identity in the state/config dicts
+        self.dependent_sections = [sys.intern(s) for s in self.dependent_sections]
         workdir_str = self._get_config_value(self.workdir_key, ".")
-        self.workdir = (self.config_path.parent / Path(workdir_str)).resolve()
+        self.workdir = absolute_path(self.config_path.parent / workdir_str)
         if not self.workdir.exists():
-            self.logger.info(f"Workdir {self.workdir} does not exist. Creating it.")
+            self.logger.info("Workdir %s does not exist. Creating it.", self.workdir)
             self.workdir.mkdir(parents=True, exist_ok=True)
         else:
-            self.logger.info(f"Workdir {self.workdir} already exists.")
-        self.state_file = self.workdir / ".statesman_state.yaml"
+            self.logger.info("Workdir %s already exists.", self.workdir)
+        # Managed paths are fixed once the workdir is known, and kept as plain
+        # strings so the hot loops skip pathlib's per-call overhead
+        workdir = str(self.workdir)
+        self._input_paths = [
+            (mf, os.path.join(workdir, mf.name)) for mf in self.input_files
+        ]
+        self._output_paths = [os.path.join(workdir, name) for name in self.output_files]
+        self._config_path_str = str(self.config_path)
+        self.state_file = self.workdir / ".statesman_state.log"
+        self._legacy_state_file = self.workdir / ".statesman_state.yaml"
         self.previous_states = self.load_previous_states()
+        # Section hashes memoized for the current needs_run/run call only
+        self._section_hashes: Optional[Dict[str, str]] = None
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """The loaded configuration.
+
+        Callers may edit it in place, so once it is handed out the config file's
+        root hash no longer vouches for its sections.
+        """
+        self._trusted_root = None
+        return self._config
+
+    @config.setter
+    def config(self, value: Dict[str, Any]):
+        self._config = value
+        self._trusted_root = None
 
     def _get_config_value(self, key: str, default: Any) -> Any:
         """Get a value from config using dotted key path."""
-        keys = key.split(".")
-        value = self.config
-        for k in keys:
+        value = self._config
+        for k in _key_parts(key):
             if isinstance(value, dict) and k in value:
                 value = value[k]
             else:
                 return default
+        if isinstance(value, (dict, list)):
+            self._trusted_root = None  # Nested containers can be edited in place
         return value
 
     def load_config(self) -> Dict[str, Any]:
         """Load configuration from YAML file."""
-        self.logger.info(f"Loading config from {self.config_path}")
-        with open(self.config_path) as f:
-            return yaml.YAML().load(f)
+        return self._read_config()[0]
+
+    def _read_config(self) -> Tuple[Dict[str, Any], str]:
+        """Load a fresh copy of the config and its root (the raw file's hash)."""
+        self.logger.info("Loading config from %s", self.config_path)
+        st = os.stat(self.config_path)
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cached = _config_cache.get(self.config_path)
+        if cached is not None and cached[0] == key:
+            _, blob, root = cached
+            config = marshal.loads(blob)
+        else:
+            settled = time.time_ns() - st.st_mtime_ns > _RACY_WINDOW_NS
+            cache_path = None
+            if settled and self.config_cache_dir is not None:
+                name = hash_bytes(os.fsencode(self.config_path))
+                cache_path = Path(self.config_cache_dir) / f"{name}.cache"
+            parsed = read_parse_cache(cache_path, key) if cache_path else None
+            if parsed is not None:
+                config, root = parsed
+            else:
+                raw = self.config_path.read_bytes()
+                config = _YAML.load(raw)
+                # Merkle root of the config: sections saved under it are unchanged
+                root = hash_bytes(raw)
+                if cache_path is not None:
+                    write_parse_cache(cache_path, key, (config, root))
+            if settled:
+                try:
+                    blob = marshal.dumps(config)
+                except ValueError:  # e.g. dates, which marshal cannot represent
+                    pass
+                else:
+                    _config_cache[self.config_path] = (key, blob, root)
+        self._last_read = (config, root)
+        return config, root
+
+    def _config_root(self) -> Optional[str]:
+        """Get the root hash of the config file, while `self.config` matches it."""
+        return self._trusted_root
 
     def load_previous_states(self) -> Dict[str, str]:
-        """Load previous state hashes from file."""
+        """Load previous section hashes, and the config roots they came from."""
+        self._roots: Dict[str, str] = {}
+        self._dirty_sections: Set[str] = set()
+        self._state_lines = 0
+        self._state_torn = False
         if self.state_file.exists():
-            self.logger.info(f"Loading previous states from {self.state_file}")
-            with open(self.state_file) as f:
-                return yaml.YAML().load(f) or {}
-        self.logger.info("No previous states found.")
+            self.logger.info("Loading previous states from %s", self.state_file)
+            return self._read_state_log()
+        if self._legacy_state_file.exists():
+            # Replaced on the next write; its hashes would not match anyway
+            self.logger.info("Previous states use an outdated format. Discarding.")
+        else:
+            self.logger.info("No previous states found.")
         return {}
 
-    def save_state(self, section: str, hash_value: str):
-        """Save state hash for a section."""
-        self.logger.info(f"Saving state for section '{section}' with hash {hash_value}")
+    def _read_state_log(self) -> Dict[str, str]:
+        """Replay the state log; later lines override earlier ones."""
+        lines = self.state_file.read_text(encoding="utf-8").split("\n")
+        if lines[0] != _STATE_HEADER:
+            self.logger.info("Previous states use an outdated format. Discarding.")
+            self._state_torn = True  # Rewrite rather than append to it
+            return {}
+        # The last element is empty unless an append was cut short; drop it either
+        # way, and rewrite the log on the next flush so appends start on a new line
+        self._state_torn = lines[-1] != ""
+        entries = lines[1:-1]
+        states = {}
+        for line in entries:
+            fields = line.split("\t")
+            if len(fields) != 3:
+                continue
+            section, hash_, root = fields
+            section = sys.intern(section)
+            states[section] = hash_
+            if root:
+                self._roots[section] = root
+            else:
+                self._roots.pop(section, None)
+        self._state_lines = len(entries)
+        return states
+
+    def save_state(self, section: str, hash_value: str, flush: bool = True):
+        """Save state hash for a section, with the config root it came from.
+
+        The root is only recorded when `hash_value` matches the section's current
+        hash, since a matching root later vouches for the saved hash unchecked.
+        With `flush=False` the update is kept in memory until `_flush_state`.
+        """
+        root = self._config_root()
+        if root is not None and hash_value != self._section_hash(section):
+            root = None
+        self._record_state(section, hash_value, root)
+        if flush:
+            self._flush_state()
+
+    def _record_state(self, section: str, hash_value: str, root: Optional[str]):
+        """Record a section's hash and config root in memory."""
+        self.logger.info(
+            "Saving state for section '%s' with hash %s", section, hash_value
+        )
+        previous = (self.previous_states.get(section), self._roots.get(section))
         self.previous_states[section] = hash_value
-        with open(self.state_file, "w") as f:
-            yaml.YAML().dump(self.previous_states, f)
+        if root is not None:
+            self._roots[section] = root
+        else:
+            self._roots.pop(section, None)
+        if (hash_value, root) != previous:
+            self._dirty_sections.add(section)
+
+    def _state_line(self, section: str) -> str:
+        """Format one state log line for a section."""
+        root = self._roots.get(section, "")
+        return f"{section}\t{self.previous_states[section]}\t{root}\n"
+
+    def _flush_state(self):
+        """Append changed section states to the state log in a single write.
+
+        The log is rewritten from scratch instead when it is missing, unreadable,
+        cut short, or has grown to `_STATE_COMPACT_RATIO` lines per section.
+        """
+        exists = self.state_file.exists()
+        if not self._dirty_sections and exists and not self._state_torn:
+            return
+        lines = self._state_lines + len(self._dirty_sections)
+        if (
+            not exists
+            or self._state_torn
+            or lines > _STATE_COMPACT_RATIO * len(self.previous_states)
+        ):
+            self._compact_state()
+        else:
+            with open(self.state_file, "a", encoding="utf-8") as f:
+                f.write("".join(map(self._state_line, self._dirty_sections)))
+            self._state_lines = lines
+        self._dirty_sections.clear()
+
+    def _compact_state(self):
+        """Rewrite the state log atomically with one line per section."""
+        body = "".join(map(self._state_line, self.previous_states))
+        # A unique temporary name keeps steps sharing a workdir from clobbering it
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.workdir, prefix=self.state_file.name, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f"{_STATE_HEADER}\n{body}")
+            os.replace(tmp_name, self.state_file)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self._state_lines = len(self.previous_states)
+        self._state_torn = False
+        self._legacy_state_file.unlink(missing_ok=True)
+
+    @contextmanager
+    def _hash_scope(self):
+        """Memoize section hashes until the outermost scope exits.
+
+        The config can be edited in place between calls, so hashes are never
+        reused across separate needs_run/run calls.
+        """
+        if self._section_hashes is not None:
+            yield
+            return
+        self._section_hashes = {}
+        try:
+            yield
+        finally:
+            self._section_hashes = None
+
+    def _section_hash(self, section: str) -> str:
+        """Hash a config section, memoized within the current hash scope."""
+        memo = self._section_hashes
+        current_hash = memo.get(section) if memo is not None else None
+        if current_hash is None:
+            current_hash = hash_config_section(self._config.get(section, {}))
+            if memo is not None:
+                memo[section] = current_hash
+        return current_hash
 
     def has_section_changed(self, section: str) -> bool:
         """Check if a config section has changed."""
-        current_hash = hash_config_section(self.config.get(section, {}))
         previous_hash = self.previous_states.get(section)
+        if previous_hash is None:
+            self.logger.info("Section '%s' changed: no previous state", section)
+            return True
+        # An unchanged config root means none of its sections changed either
+        root = self._config_root()
+        if root is not None and self._roots.get(section) == root:
+            self.logger.info("Section '%s' unchanged: config root matches", section)
+            return False
+        current_hash = self._section_hash(section)
         changed = current_hash != previous_hash
         self.logger.info(
-            f"Section '{section}' changed: {changed} (current: {current_hash}, previous: {previous_hash})"
+            "Section '%s' changed: %s (current: %s, previous: %s)",
+            section,
+            changed,
+            current_hash,
+            previous_hash,
         )
         return changed
 
-    def needs_run(self) -> bool:
+    def needs_run(self) -> RunReason:
         """Determine if the step needs to be run based on inputs, outputs, and sections."""
+        with self._hash_scope():
+            return self._needs_run()
+
+    def _needs_run(self) -> RunReason:
+        """Run the `needs_run` checks, cheapest first."""
         self.logger.info("Checking if step needs to run.")
-        # Check inputs
-        for mf in self.input_files:
-            path = self.workdir / mf.name
-            newer_than = (
-                self.config_path if mf.newer_than == "config" else mf.newer_than
-            )
+        # Stat every managed file and the config exactly once; checks reuse these
+        in_paths = [path for _, path in self._input_paths]
+        config_path = self._config_path_str
+        stats = stat_many((*in_paths, *self._output_paths, config_path))
+
+        # Check inputs, tracking the newest one in the same pass
+        newest_in, newest_in_mtime = None, 0.0
+        for mf, path in self._input_paths:
+            if mf.newer_than == "config":
+                newer_than = config_path
+            else:
+                newer_than = os.fspath(mf.newer_than) if mf.newer_than else None
             try:
-                state = FileState(
-                    path=path, non_empty=mf.non_empty, newer_than=newer_than
-                )
-                self.logger.info(f"Input file '{path}' is valid.")
-            except ValidationError as e:
-                self.logger.warning(f"Input file '{path}' invalid: {e}. Needs run.")
-                return True
-
-        # Check if any output is missing
-        for out_name in self.output_files:
-            out_path = self.workdir / out_name
-            if not out_path.exists() or out_path.stat().st_size == 0:
+                FileState._check_paths(path, mf.non_empty, newer_than, stats)
+            except ValueError as e:
+                self.logger.warning("Input file '%s' invalid: %s. Needs run.", path, e)
+                return RunReason(RunTrigger.INVALID_INPUT)
+            in_mtime = stats[path].st_mtime
+            if newest_in is None or in_mtime > newest_in_mtime:
+                newest_in, newest_in_mtime = path, in_mtime
+            self.logger.info("Input file '%s' is valid.", path)
+
+        # Check if any output is missing, tracking the oldest one in the same pass
+        oldest_out, oldest_out_mtime = None, 0.0
+        for out_path in self._output_paths:
+            out_stat = stats[out_path]
+            if out_stat is None or out_stat.st_size == 0:
                 self.logger.warning(
-                    f"Output file '{out_path}' is missing or empty. Needs run."
+                    "Output file '%s' is missing or empty. Needs run.", out_path
                 )
-                return True
-            self.logger.info(f"Output file '{out_path}' exists and is non-empty.")
-
-        # Check if any input is newer than any output
-        for out_name in self.output_files:
-            out_path = self.workdir / out_name
-            out_mtime = get_file_mtime(out_path)
-            for mf in self.input_files:
-                in_path = self.workdir / mf.name
-                in_mtime = get_file_mtime(in_path)
-                if in_mtime > out_mtime:
-                    self.logger.warning(
-                        f"Input '{in_path}' is newer than output '{out_path}'. Needs run."
-                    )
-                    return True
+                return RunReason(RunTrigger.MISSING_OUTPUT)
+            if oldest_out is None or out_stat.st_mtime < oldest_out_mtime:
+                oldest_out, oldest_out_mtime = out_path, out_stat.st_mtime
+            self.logger.info("Output file '%s' exists and is non-empty.", out_path)
+
+        # Check if the newest input is newer than the oldest output
+        if (
+            newest_in is not None
+            and oldest_out is not None
+            and newest_in_mtime > oldest_out_mtime
+        ):
+            self.logger.warning(
+                "Input '%s' is newer than output '%s'. Needs run.",
+                newest_in,
+                oldest_out,
+            )
+            return RunReason(RunTrigger.INPUT_NEWER)
+
+        # Section checks are the most expensive, so they run last, and only if any
+        if not self.dependent_sections:
+            self.logger.info("No changes detected. Step does not need to run.")
+            return RunReason()
 
         # Check if any dependent section changed
+        unchanged = []
         for section in self.dependent_sections:
             if self.has_section_changed(section):
                 self.logger.warning(
-                    f"Dependent section '{section}' has changed. Needs run."
+                    "Dependent section '%s' has changed. Needs run.", section
                 )
-                return True
+                return RunReason(
+                    RunTrigger.SECTION_CHANGED,
+                    changed_sections=frozenset([section]),
+                    unchanged_sections=frozenset(unchanged),
+                )
+            unchanged.append(section)
 
         self.logger.info("No changes detected. Step does not need to run.")
-        return False
+        return RunReason(unchanged_sections=frozenset(unchanged))
 
     def run(self, force: bool = False):
         """Run the step if necessary or forced, and update states."""
         self.logger.info("Starting run check.")
-        if force or self.needs_run():
-            self.logger.info("Step needs to run or is forced. Executing...")
-            # Compute current hashes before execution to capture the state that triggered the run
+        with self._hash_scope():
+            reason = RunReason() if force else self.needs_run()
+            if not (force or reason):
+                self.logger.info("Step does not need to run.")
+                return
+            # Compute current hashes before execution to capture the state that
+            # triggered the run, reusing the hashes needs_run computed; sections
+            # verified unchanged keep their saved hash
             current_hashes = {
-                section: hash_config_section(self.config.get(section, {}))
+                section: self.previous_states[section]
+                if section in reason.unchanged_sections
+                else self._section_hash(section)
                 for section in self.dependent_sections
             }
-            self._execute()
-            self.logger.info("Execution completed.")
-            # Update states for dependent sections
-            for section in self.dependent_sections:
-                self.save_state(section, current_hashes[section])
-            # Validate outputs after execution
-            for out_name in self.output_files:
-                out_path = self.workdir / out_name
-                if not out_path.exists() or out_path.stat().st_size == 0:
-                    error_msg = f"Output file '{out_path}' was not created properly."
-                    self.logger.error(error_msg)
-                    raise RuntimeError(error_msg)
-                self.logger.info(f"Output file '{out_path}' validated successfully.")
-        else:
-            self.logger.info("Step does not need to run.")
+        self.logger.info("Step needs to run or is forced. Executing...")
+        # _execute may read (and edit) self.config, so take the root first
+        root = self._config_root()
+        self._execute()
+        self.logger.info("Execution completed.")
+        # Update states for dependent sections, writing the state file once
+        for section in self.dependent_sections:
+            self._record_state(section, current_hashes[section], root)
+        if self.dependent_sections:
+            self._flush_state()
+        # Validate outputs after execution
+        for out_path in self._output_paths:
+            if not is_file_non_empty(out_path):
+                error_msg = f"Output file '{out_path}' was not created properly."
+                self.logger.error(error_msg)
+                raise RuntimeError(error_msg)
+            self.logger.info("Output file '%s' validated successfully.", out_path)
 
     def _execute(self):
         """User-defined execution logic. Subclasses should override this."""
@@ -1,9 +1,12 @@
 """Pydantic models for states."""
 
+import os
 from pathlib import Path
-from pydantic import BaseModel, field_validator, ValidationInfo
+from typing import Dict, Optional, Union
 
-from statesman.utils.file_utils import get_file_mtime, is_file_non_empty
+from pydantic import BaseModel, model_validator
+
+from statesman.utils.file_utils import stat_or_none
 
 
 class FileState(BaseModel):
@@ -13,28 +16,39 @@ class FileState(BaseModel):
     non_empty: bool = True
     newer_than: Path | None = None
 
-    @field_validator("path")
-    @classmethod
-    def check_exists(cls, v: Path) -> Path:
-        if not v.exists():
-            raise ValueError(f"File does not exist: {v}")
-        return v
+    @model_validator(mode="after")
+    def check_file(self) -> "FileState":
+        """Validate existence, size and age with one stat per file."""
+        self._check_paths(self.path, self.non_empty, self.newer_than)
+        return self
 
-    @field_validator("non_empty", mode="after")
     @classmethod
-    def check_non_empty(cls, v: bool, info: ValidationInfo) -> bool:
-        if "path" not in info.data:
-            return v
-        path = info.data["path"]
-        if v and not is_file_non_empty(path):
+    def _check_paths(
+        cls,
+        path: Union[str, Path],
+        non_empty: bool,
+        newer_than: Union[str, Path, None],
+        stats: Optional[Dict[Union[str, Path], Optional[os.stat_result]]] = None,
+    ) -> None:
+        """Run the state checks without building a model, raising ValueError.
+
+        `stats` optionally caches stat results by path (None for missing files);
+        paths not in it yet are stat'ed and added.
+        """
+        if stats is None:
+            stats = {}
+
+        def lookup(p: Union[str, Path]) -> Optional[os.stat_result]:
+            if p not in stats:
+                stats[p] = stat_or_none(p)
+            return stats[p]
+
+        st = lookup(path)
+        if st is None:
+            raise ValueError(f"File does not exist: {path}")
+        if non_empty and st.st_size == 0:
             raise ValueError(f"File is empty: {path}")
-        return v
-
-    @field_validator("newer_than", mode="after")
-    @classmethod
-    def check_newer_than(cls, v: Path | None, info: ValidationInfo) -> Path | None:
-        if v and "path" in info.data:
-            path = info.data["path"]
-            if get_file_mtime(path) <= get_file_mtime(v):
-                raise ValueError(f"File {path} is not newer than {v}")
-        return v
+        if newer_than:
+            ref = lookup(newer_than)
+            if st.st_mtime <= (ref.st_mtime if ref is not None else 0.0):
+                raise ValueError(f"File {path} is not newer than {newer_than}")
@@ -1,17 +1,64 @@
 """Utilities for config operations."""
 
 import hashlib
-from io import StringIO
-from typing import Any, Dict
+import json
+import marshal
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
 
-import ruamel.yaml as yaml
+# json.dumps builds a new encoder per call when given options; build it once.
+_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str)
+_HASHER = hashlib.blake2b
+
+
+def canonical_section_bytes(section: Dict[str, Any]) -> bytes:
+    """Serialize a config section to compact JSON bytes, preserving key order."""
+    return _ENCODER.encode(section).encode("utf-8")
+
+
+def hash_bytes(data: bytes) -> str:
+    """Compute a 256-bit BLAKE2b hex digest of raw bytes."""
+    return _HASHER(data, digest_size=32).hexdigest()
 
 
 def hash_config_section(section: Dict[str, Any]) -> str:
-    """Compute SHA-256 hash of a config section using ruamel.yaml for string representation preserving order."""
-    # Dump the section to YAML string preserving order and formatting
-    stream = StringIO()
-    y = yaml.YAML()
-    y.dump(section, stream)
-    yaml_str = stream.getvalue()
-    return hashlib.sha256(yaml_str.encode()).hexdigest()
+    """Compute a 256-bit BLAKE2b hash of the canonical bytes of a config section."""
+    return hash_bytes(canonical_section_bytes(section))
+
+
+def read_parse_cache(cache_path: Path, key: Tuple[Any, ...]) -> Optional[Any]:
+    """Read a value cached by `write_parse_cache`, or None if missing or stale."""
+    try:
+        cached_key, value = marshal.loads(cache_path.read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return value if cached_key == (marshal.version, *key) else None
+
+
+def write_parse_cache(cache_path: Path, key: Tuple[Any, ...], value: Any) -> None:
+    """Atomically cache a parsed value under `key`, skipping unsupported values.
+
+    marshal is faster than pickle for plain containers, but neither is safe
+    against malicious data, so the cache belongs in a directory only the user
+    can write to.
+    """
+    try:
+        data = marshal.dumps(((marshal.version, *key), value))
+    except ValueError:  # e.g. dates, which marshal cannot represent
+        return
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # A unique temporary name keeps concurrent writers from clobbering it
+        fd, tmp_name = tempfile.mkstemp(
+            dir=cache_path.parent, prefix=cache_path.name, suffix=".tmp"
+        )
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, cache_path)
+    except OSError:
+        Path(tmp_name).unlink(missing_ok=True)
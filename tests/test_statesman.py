@@ -1,11 +1,20 @@
 """Tests for statesman."""
 
+import dataclasses
+import os
 import time
 import pytest
-from statesman.core.base import Statesman, ManagedFile
+from statesman.cli.main import StatesmanSession
+from statesman.core.base import Statesman, ManagedFile, RunTrigger
 from statesman.models.state import FileState
-from statesman.utils.config_utils import hash_config_section
-from statesman.utils.file_utils import get_file_mtime, is_file_non_empty
+from statesman.utils.config_utils import canonical_section_bytes, hash_config_section
+from statesman.utils.file_utils import (
+    PARALLEL_STAT_THRESHOLD,
+    get_file_mtime,
+    is_file_non_empty,
+    stat_many,
+    stat_or_none,
+)
 
 
 @pytest.fixture
@@ -62,7 +71,7 @@ def test_hash_config_section():
     section = {"key": "value"}
     hash1 = hash_config_section(section)
     assert isinstance(hash1, str)
-    assert len(hash1) == 64  # SHA-256 hex
+    assert len(hash1) == 64  # 256-bit hex digest
     hash2 = hash_config_section(section)
     assert hash1 == hash2
     different = {"key": "different"}
@@ -75,6 +84,25 @@ def test_hash_config_section():
     assert hash_config_section(nested_reordered) != hash_nested
 
 
+def test_config_uses_yaml_1_2(tmp_path):
+    """Test that YAML 1.1-only scalars are not reinterpreted."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("a: NO\nb: on\nc: 010\nd: 1:20\ne: 1e3\nf: true")
+    sm = Statesman(str(config_path))
+    expected = {"a": "NO", "b": "on", "c": 10, "d": "1:20", "e": 1000.0, "f": True}
+    assert sm.config == expected
+
+
+def test_canonical_section_bytes():
+    section = {"b": [1.5, "x"], "a": {"c": None}}
+    assert canonical_section_bytes(section) == b'{"b":[1.5,"x"],"a":{"c":null}}'
+    assert canonical_section_bytes({"n": 2**70}) == b'{"n":1180591620717411303424}'
+    assert canonical_section_bytes({"x": 1e16}) == b'{"x":1e+16}'
+    # Non-finite floats must not collapse into null
+    special = [{"x": float("nan")}, {"x": float("inf")}, {"x": None}]
+    assert len({hash_config_section(section) for section in special}) == 3
+
+
 def test_file_utils(tmp_path):
     empty = tmp_path / "empty.txt"
     empty.touch()
@@ -89,6 +117,42 @@ def test_file_utils(tmp_path):
 
     assert get_file_mtime(non_empty) > 0
 
+    assert stat_or_none(missing) is None
+    assert stat_or_none(non_empty).st_size == 4
+    assert stat_or_none(non_empty / "child.txt") is None  # Parent is a file
+    loop = tmp_path / "loop"
+    loop.symlink_to(loop)
+    assert stat_or_none(loop) is None
+
+    many = [tmp_path / f"f{i}.txt" for i in range(PARALLEL_STAT_THRESHOLD)]
+    for path in many[1:]:
+        path.write_text("data")
+    stats = stat_many(many + [missing])
+    assert stats[many[0]] is None and stats[missing] is None
+    assert all(stats[path].st_size == 4 for path in many[1:])
+
+
+def _stat_many_in_child(paths, queue):
+    queue.put(len(stat_many(paths)))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_stat_many_after_fork(tmp_path):
+    """Test that a forked child can stat in parallel after the parent did."""
+    import multiprocessing
+
+    paths = [tmp_path / f"f{i}.txt" for i in range(4 * PARALLEL_STAT_THRESHOLD)]
+    stat_many(paths)  # Start the parent's pool
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    child = ctx.Process(target=_stat_many_in_child, args=(paths, queue))
+    child.start()
+    child.join(timeout=10)
+    if child.is_alive():
+        child.kill()
+    assert child.exitcode == 0
+    assert queue.get(timeout=1) == len(paths)
+
 
 class TestStep(Statesman):
     __test__ = False
@@ -298,3 +362,422 @@ def test_run_force_flag(tmp_path):
 
     # Check that _execute was called, overwriting the output
     assert output_path.read_text() == "executed"
+
+
+def test_needs_run_skips_hashing_for_unchanged_config(tmp_path, monkeypatch):
+    """Test that an unchanged config short-circuits section hashing."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    time.sleep(0.01)
+    (sm.workdir / "input.txt").write_text("data")
+    time.sleep(0.01)
+    (sm.workdir / "output.txt").write_text("data")
+
+    # Without a saved state the hash path is still taken
+    assert sm.needs_run()
+    sm.save_state("test", hash_config_section({"subkey": "value"}))
+
+    def fail(section):
+        raise AssertionError("section should not be hashed")
+
+    monkeypatch.setattr("statesman.core.base.hash_config_section", fail)
+    assert not sm.needs_run()
+
+
+def test_needs_run_detects_restored_older_config(tmp_path):
+    """Test that a changed config with an older mtime is still detected."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    (sm.workdir / "input.txt").write_text("data")
+    sm.run()
+    assert not sm.needs_run()
+
+    # Like `cp -p` or `rsync -t` restoring a backup over the config
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: restored")
+    old = time.time() - 3600
+    os.utime(config_path, (old, old))
+    os.utime(sm.workdir / "input.txt", (old + 1, old + 1))
+    restored = TestStep(str(config_path))
+    assert restored.needs_run().trigger is RunTrigger.SECTION_CHANGED
+
+
+def test_in_place_config_edit_is_detected(tmp_path):
+    """Test that editing the loaded config in place is not hidden by its root."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    (sm.workdir / "input.txt").write_text("data")
+    sm.run()
+
+    edited = TestStep(str(config_path))
+    assert not edited.needs_run()
+    edited.config["test"]["subkey"] = "edited"
+    assert edited.needs_run().trigger is RunTrigger.SECTION_CHANGED
+
+    # Hashes memoized during run() are not reused after an in-place edit
+    sm.config["test"]["subkey"] = "edited"
+    assert sm.has_section_changed("test")
+    assert sm.needs_run().trigger is RunTrigger.SECTION_CHANGED
+
+
+def test_section_hash_memoized_within_run(tmp_path, monkeypatch):
+    """Test that each section is hashed once per run() call."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    (sm.workdir / "input.txt").write_text("data")
+
+    calls = []
+
+    def counting_hash(section):
+        calls.append(section)
+        return hash_config_section(section)
+
+    monkeypatch.setattr("statesman.core.base.hash_config_section", counting_hash)
+    sm.run()
+    assert len(calls) == 1  # needs_run and the post-execute save share the hash
+
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: changed")
+    sm.config = sm.load_config()
+    assert sm.has_section_changed("test")
+    assert len(calls) == 2
+
+
+def test_config_root_skips_hashing(tmp_path, monkeypatch):
+    """Test that sections saved under an unchanged config root are not re-hashed."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    (sm.workdir / "input.txt").write_text("data")
+    sm.run()
+
+    # Touching the config without editing it keeps the root
+    config_path.touch()
+    reloaded = TestStep(str(config_path))
+
+    def fail(section):
+        raise AssertionError("section should not be hashed")
+
+    monkeypatch.setattr("statesman.core.base.hash_config_section", fail)
+    assert not reloaded.has_section_changed("test")
+
+    # Editing the config changes the root, so the section is hashed again
+    monkeypatch.undo()
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: other")
+    reloaded.config = reloaded.load_config()
+    assert reloaded.has_section_changed("test")
+
+
+def test_load_config_override_is_used(tmp_path):
+    """Test that a subclass overriding load_config shapes the instance."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    sm.save_state("test", hash_config_section({"subkey": "value"}))
+
+    class OverrideStep(TestStep):
+        def load_config(self):
+            config = super().load_config()
+            config["test"]["subkey"] = "overridden"
+            return config
+
+    step = OverrideStep(str(config_path))
+    assert step.config["test"] == {"subkey": "overridden"}
+    assert step.has_section_changed("test")  # Not hidden by the file's root
+
+    class OtherWorkdirStep(TestStep):
+        def load_config(self):
+            return {**super().load_config(), "workdir": "other_dir"}
+
+    assert OtherWorkdirStep(str(config_path)).workdir == tmp_path / "other_dir"
+
+
+def test_save_state_with_stale_hash_skips_root(tmp_path):
+    """Test that a saved hash not matching the config is not vouched for by root."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    sm.save_state("test", "bogus")
+    assert "test" not in sm._roots
+    assert TestStep(str(config_path)).has_section_changed("test")
+
+
+def test_outdated_state_file_is_discarded(tmp_path):
+    """Test that states written by an older schema version are ignored."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    work_dir = tmp_path / "work_dir"
+    work_dir.mkdir()
+    legacy = work_dir / ".statesman_state.yaml"
+    legacy.write_text("test: abc123\n")
+    sm = TestStep(str(config_path))
+    assert sm.previous_states == {}
+    assert sm.has_section_changed("test")
+
+    # The old file is removed once the new log is written
+    (work_dir / "input.txt").write_text("data")
+    sm.run()
+    assert sm.state_file.exists() and not legacy.exists()
+
+    sm.state_file.write_text("@version\t4\ntest\tabc123\t\n")
+    assert TestStep(str(config_path)).previous_states == {}
+
+
+def test_needs_run_invalid_inputs(tmp_path):
+    """Test that empty or stale inputs trigger a run."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir")
+
+    class NestedInput(Statesman):
+        input_files = [ManagedFile(name="f/in.txt")]
+
+    nested = NestedInput(str(config_path))
+    (nested.workdir / "f").write_text("not a directory")
+    assert nested.needs_run().trigger is RunTrigger.INVALID_INPUT
+
+    sm = TestStep(str(config_path))
+    time.sleep(0.01)
+    input_path = sm.workdir / "input.txt"
+    input_path.touch()
+    (sm.workdir / "output.txt").write_text("data")
+    assert sm.needs_run()  # Input is empty
+
+    input_path.write_text("data")
+    time.sleep(0.01)
+    config_path.write_text("workdir: work_dir")
+    assert sm.needs_run()  # Input is not newer than config
+
+
+def test_load_config_reuses_parsed_config(tmp_path, monkeypatch):
+    """Test that an unchanged, settled config file is parsed only once."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    old = time.time() - 10
+    os.utime(config_path, (old, old))
+    first = TestStep(str(config_path))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("config should not be parsed again")
+
+    monkeypatch.setattr("statesman.core.base._YAML.load", fail)
+    second = TestStep(str(config_path))
+    assert second.config == first.config
+
+    # Each instance gets its own copy, so edits do not leak into later steps
+    second.config["test"]["subkey"] = "edited"
+    assert TestStep(str(config_path)).config == first.config
+
+
+def test_run_writes_state_file_once(tmp_path, monkeypatch):
+    """Test that run() batches section states into a single atomic write."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\na: 1\nb: 2\nc: 3\ngröße: 4", "utf-8")
+
+    class MultiStep(Statesman):
+        dependent_sections = ["a", "b", "c", "größe"]
+
+        def _execute(self):
+            pass
+
+    sm = MultiStep(str(config_path))
+    flushes = []
+    original = sm._flush_state
+    monkeypatch.setattr(sm, "_flush_state", lambda: flushes.append(original()))
+    sm.run()
+    assert len(flushes) == 1
+    assert not list(sm.workdir.glob("*.tmp"))
+    assert MultiStep(str(config_path)).previous_states == sm.previous_states
+
+
+def test_needs_run_reports_reason(tmp_path):
+    """Test that needs_run reports which check triggered the run."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    time.sleep(0.01)
+    (sm.workdir / "input.txt").write_text("data")
+    assert sm.needs_run().trigger is RunTrigger.MISSING_OUTPUT
+
+    (sm.workdir / "output.txt").write_text("data")
+    reason = sm.needs_run()
+    assert reason.trigger is RunTrigger.SECTION_CHANGED
+    assert reason.changed_sections == {"test"}
+
+    sm.run()
+    reason = sm.needs_run()
+    assert not reason
+    assert reason.unchanged_sections == {"test"}
+
+
+def test_load_config_uses_disk_cache(tmp_path, monkeypatch):
+    """Test that a settled config is parsed once across processes, if enabled."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    old = time.time() - 10
+    os.utime(config_path, (old, old))
+    TestStep(str(config_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["config.yaml", "work_dir"]
+
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(TestStep, "config_cache_dir", cache_dir)
+    monkeypatch.setattr("statesman.core.base._config_cache", {})
+    first = TestStep(str(config_path))
+    assert [p.suffix for p in cache_dir.iterdir()] == [".cache"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("config should not be parsed again")
+
+    monkeypatch.setattr("statesman.core.base._config_cache", {})
+    monkeypatch.setattr("statesman.core.base._YAML.load", fail)
+    second = TestStep(str(config_path))
+    assert second.config == first.config
+
+
+def test_section_without_state_is_not_hashed(tmp_path, monkeypatch):
+    """Test that a section with no saved state counts as changed without hashing."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+
+    def fail(section):
+        raise AssertionError("section should not be hashed")
+
+    monkeypatch.setattr("statesman.core.base.hash_config_section", fail)
+    assert sm.has_section_changed("test")
+
+
+def test_managed_file_is_frozen_value_object():
+    mf = ManagedFile(name="input.txt")
+    assert mf == ManagedFile(name="input.txt", non_empty=True, newer_than=None)
+    assert not hasattr(mf, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        mf.name = "other.txt"
+
+
+def test_unchanged_state_is_not_rewritten(tmp_path, monkeypatch):
+    """Test that a forced rerun with identical hashes skips the state write."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    (sm.workdir / "input.txt").write_text("data")
+    sm.run()
+    assert sm.state_file.exists()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("state file should not be rewritten")
+
+    monkeypatch.setattr(sm, "_state_line", fail)
+    sm.run(force=True)
+
+    # A deleted state file is written again even if nothing changed
+    monkeypatch.undo()
+    sm.state_file.unlink()
+    sm.run(force=True)
+    assert sm.state_file.exists()
+
+
+def test_state_log_appends_and_compacts(tmp_path):
+    """Test that state updates are appended, replayed, and compacted."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    sm = TestStep(str(config_path))
+    (sm.workdir / "input.txt").write_text("data")
+    sm.run()
+    assert len(sm.state_file.read_text().splitlines()) == 2
+
+    for i in range(3):
+        sm.config = {**sm.config, "test": {"subkey": i}}
+        sm.run(force=True)
+    assert len(sm.state_file.read_text().splitlines()) == 5
+
+    sm.config = {**sm.config, "test": {"subkey": "compact"}}
+    sm.run(force=True)
+    assert len(sm.state_file.read_text().splitlines()) == 2
+    assert TestStep(str(config_path)).previous_states == sm.previous_states
+
+    # A truncated trailing append is ignored on replay, and the next write
+    # rewrites the log instead of gluing onto the partial line
+    with open(sm.state_file, "a") as f:
+        f.write("test\tdead")
+    torn = TestStep(str(config_path))
+    assert torn.previous_states == sm.previous_states
+    torn.config = {**torn.config, "test": {"subkey": "after"}}
+    torn.run(force=True)
+    assert sm.state_file.read_text().endswith("\n")
+    assert TestStep(str(config_path)).previous_states == torn.previous_states
+
+
+def test_needs_run_stats_shared_reference_once(tmp_path, monkeypatch):
+    """Test that inputs sharing newer_than='config' stat the config once."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir")
+
+    class ManyInputs(Statesman):
+        input_files = [
+            ManagedFile(name=f"in{i}.txt", newer_than="config") for i in range(5)
+        ]
+        output_files = ["out.txt"]
+
+    sm = ManyInputs(str(config_path))
+    time.sleep(0.01)
+    for mf in sm.input_files:
+        (sm.workdir / mf.name).write_text("data")
+    time.sleep(0.01)
+    (sm.workdir / "out.txt").write_text("data")
+
+    stat_calls = []
+    real_stat = os.stat
+
+    def counting_stat(path, *args, **kwargs):
+        stat_calls.append(os.fspath(path))
+        return real_stat(path, *args, **kwargs)
+
+    monkeypatch.setattr("statesman.utils.file_utils.os.stat", counting_stat)
+    assert not sm.needs_run()
+    assert stat_calls.count(str(sm.config_path)) == 1
+    assert len(stat_calls) == len(set(stat_calls))
+
+
+def test_paths_are_normalized_without_resolving_symlinks(tmp_path):
+    """Test that paths are made absolute, resolving symlinks only for '..'."""
+    real_dir = tmp_path / "real" / "configs"
+    real_dir.mkdir(parents=True)
+    (real_dir / "config.yaml").write_text("workdir: work_dir")
+    link_dir = tmp_path / "link"
+    link_dir.symlink_to(real_dir)
+    sm = Statesman(str(link_dir / "config.yaml"))
+    assert sm.config_path == link_dir / "config.yaml"
+    assert sm.workdir == link_dir / "work_dir"
+    assert (real_dir / "work_dir").is_dir()
+
+    # '..' after a symlink refers to the target's parent, as resolve() has it
+    (real_dir / "config.yaml").write_text("workdir: ../work")
+    sm = Statesman(str(link_dir / "config.yaml"))
+    assert sm.workdir == (tmp_path / "real" / "work").resolve()
+
+
+def test_session_reuses_step_until_its_files_change(tmp_path):
+    """Test that a session reuses a step, rebuilding it after outside changes."""
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: value")
+    session = StatesmanSession(TestStep)
+    first = session.get(str(config_path))
+    (first.workdir / "input.txt").write_text("data")
+    session.run(str(config_path))
+    assert session.get(str(config_path)) is first  # Its own state write is fine
+
+    # Another process rewriting the state log forces a rebuild
+    other = TestStep(str(config_path))
+    other.config = {**other.config, "test": {"subkey": "other"}}
+    other.run(force=True)
+    rebuilt = session.get(str(config_path))
+    assert rebuilt is not first
+    assert rebuilt.previous_states == other.previous_states
+
+    # So does editing the config
+    config_path.write_text("workdir: work_dir\ntest:\n  subkey: edited")
+    edited = session.get(str(config_path))
+    assert edited is not rebuilt
+    assert edited.config["test"] == {"subkey": "edited"}